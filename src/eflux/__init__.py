@@ -1,3 +1,3 @@
 """eflux package."""
 
-__all__ = ["eflux2", "utils"]
+__all__ = ["eflux2", "tuning", "utils"]
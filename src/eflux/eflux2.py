@@ -1,12 +1,28 @@
 """Script to run the Eflux2 Algorithm."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import cobra
 import numpy as np
 import pandas as pd
+from cobra.util.solver import linear_reaction_coefficients
+from optlang.symbolics import Zero
+
+from .utils import (
+    LazyMaxFluxBounds,
+    apply_solver_profile,
+    create_memmap_matrix,
+    load_solver_profile,
+)
 
 
 def add_slack_variables_to_model(
-    model: cobra.Model, upper_bounds: dict[str, float], slack_weight: float = 1000
+    model: cobra.Model,
+    upper_bounds: dict[str, float],
+    slack_weight: float = 1000,
+    use_solver_profile: bool = True,
 ) -> cobra.Model:
     """Add slack variables to model.
 
@@ -15,6 +31,7 @@ def add_slack_variables_to_model(
         upper_bounds: dict (or dataframe column) of reaction id keys and upper bound values for fluxes corresponding to one
                       strain/experimental condition (e.g. scaled/normalized enzyme activity or external fluxes)
         slack_weight: weight of slack variables relative to model.objective
+        use_solver_profile: solve the relaxed model with the model's saved solver profile, if there is one
     outputs:
         model: cobra model constrained using upper bounds, but relaxed using slack variables
     """
@@ -27,6 +44,11 @@ def add_slack_variables_to_model(
     # Copy model to prevent overwriting
     relaxed_model = model.copy()
 
+    # Switch to the tuned solver settings before the slack variables are added
+    profile = load_solver_profile(model) if use_solver_profile else None
+    if profile is not None:
+        apply_solver_profile(relaxed_model, profile)
+
     # Initialize list of slack variables
     slack_vars = []
 
@@ -38,7 +60,7 @@ def add_slack_variables_to_model(
         slack_vars.append(this_slack_var)
         # Add a constraint between the reaction flux and the slack variable using the upper bound
         constraint = relaxed_model.problem.Constraint(
-            this_rxn.flux_expression - this_slack_var, lb=0, ub=bound
+            this_rxn.flux_expression - this_slack_var, lb=0, ub=bound, name="SLACK_BOUND_" + r_id
         )
         relaxed_model.add_cons_vars(constraint)
 
@@ -80,21 +102,313 @@ def get_normalized_condition(
 
 
 def get_condition_specific_upper_bounds(
-    fva_upper_bounds: dict[str, float], scaling_factors: dict
+    fva_upper_bounds: dict[str, float] | LazyMaxFluxBounds, scaling_factors: dict
 ) -> dict[str, float]:
     """Get upper bounds for one experimental condition/strain only.
 
     inputs:
-        fva_upper_bounds: dictionary of reaction ids (keys) and upper bounds from FVA (values)
+        fva_upper_bounds: dictionary of reaction ids (keys) and upper bounds from FVA (values), or a
+                          LazyMaxFluxBounds that runs FVA only for reactions with scaling factors
         scaling_factors: dict of of reaction id (keys) and scaling_factors (values) obtained by
                         normalizing observed data for one strain/experimental condition with
                         respect to a reference condition
     outputs:
         dict of reaction id (keys) and upper bound on model reaction fluxes (values) for corresponding to one strain/experimental condition
     """
+    if isinstance(fva_upper_bounds, LazyMaxFluxBounds):
+        fva_upper_bounds = fva_upper_bounds.get_bounds(scaling_factors)
+
     return {r: b * scaling_factors[r] for r, b in fva_upper_bounds.items() if r in scaling_factors}
 
 
+def _build_cycle_free_problem(
+    model: cobra.Model, slack_rxn_ids: list[str] | None = None
+) -> tuple[object, np.ndarray, np.ndarray, np.ndarray]:
+    """Clone a model's solver problem and set a CycleFreeFlux objective on its internal reactions.
+
+    inputs:
+        model: cobra model (optionally relaxed by add_slack_variables_to_model)
+        slack_rxn_ids: reaction ids whose slack variables and constraints are dropped from the clone
+    outputs:
+        problem: optlang problem minimizing the total flux through internal reactions
+        internal: boolean mask (in model.reactions order) of reactions that are neither boundary nor objective reactions
+        forward_lb: lower bounds of the forward variables (in model.reactions order)
+        reverse_lb: lower bounds of the reverse variables (in model.reactions order)
+    """
+    problem = type(model.solver).clone(model.solver)
+    slack_rxn_ids = slack_rxn_ids or []
+    problem.remove(
+        [problem.constraints["SLACK_BOUND_" + r_id] for r_id in slack_rxn_ids]
+        + [problem.variables["SLACK_" + r_id] for r_id in slack_rxn_ids]
+    )
+
+    # Internal reactions are the ones whose flux can be reduced; the rest stay fixed
+    fixed_rxns = set(model.boundary) | set(linear_reaction_coefficients(model))
+    internal = np.array([r not in fixed_rxns for r in model.reactions], dtype=bool)
+    forward_lb = np.array([max(r.lower_bound, 0) for r in model.reactions], dtype=float)
+    reverse_lb = np.array([max(-r.upper_bound, 0) for r in model.reactions], dtype=float)
+
+    problem.objective = model.problem.Objective(Zero, direction="min", sloppy=True)
+    problem.objective.set_linear_coefficients({
+        problem.variables[v.name]: 1
+        for r, is_internal in zip(model.reactions, internal, strict=True)
+        if is_internal
+        for v in (r.forward_variable, r.reverse_variable)
+    })
+
+    return problem, internal, forward_lb, reverse_lb
+
+
+def _solve_cycle_free(
+    problem,
+    forward_vars: list,
+    reverse_vars: list,
+    internal: np.ndarray,
+    forward_lb: np.ndarray,
+    reverse_lb: np.ndarray,
+    fluxes: np.ndarray,
+) -> np.ndarray:
+    """Remove loops from one flux vector by a single LP on a problem from _build_cycle_free_problem.
+
+    Boundary and objective fluxes are fixed, and each internal flux may only shrink towards zero
+    without changing direction, so the input fluxes are always a feasible starting point.
+    """
+    forward = np.maximum(fluxes, 0)
+    reverse = np.maximum(-fluxes, 0)
+    forward_ub = np.where(internal, np.maximum(forward, forward_lb), forward)
+    reverse_ub = np.where(internal, np.maximum(reverse, reverse_lb), reverse)
+    forward_lb = np.where(internal, forward_lb, forward)
+    reverse_lb = np.where(internal, reverse_lb, reverse)
+    for i, (f, r) in enumerate(zip(forward_vars, reverse_vars, strict=True)):
+        f.set_bounds(forward_lb[i], forward_ub[i])
+        r.set_bounds(reverse_lb[i], reverse_ub[i])
+
+    status = problem.optimize()
+    if status != "optimal":
+        raise cobra.exceptions.OptimizationError(
+            f"Loop removal could not be solved (status: {status})"
+        )
+    primals = problem.primal_values
+
+    return np.array([
+        primals[f.name] - primals[r.name] for f, r in zip(forward_vars, reverse_vars, strict=True)
+    ])
+
+
+def remove_flux_loops(model: cobra.Model, fluxes: dict[str, float]) -> dict[str, float]:
+    """Remove thermodynamically infeasible internal loops from a flux solution (CycleFreeFlux).
+
+    inputs:
+        model: cobra model the fluxes were computed with (objective already defined)
+        fluxes: dict of reaction ids (keys) and flux values (values), e.g. from an eflux solution
+    outputs:
+        loopless_fluxes: dict of reaction ids (keys) and flux values without internal loops (values)
+    """
+    problem, internal, forward_lb, reverse_lb = _build_cycle_free_problem(model)
+    loopless_fluxes = _solve_cycle_free(
+        problem,
+        [problem.variables[r.forward_variable.name] for r in model.reactions],
+        [problem.variables[r.reverse_variable.name] for r in model.reactions],
+        internal,
+        forward_lb,
+        reverse_lb,
+        np.array([fluxes[r.id] for r in model.reactions], dtype=float),
+    )
+
+    return dict(zip([r.id for r in model.reactions], loopless_fluxes, strict=True))
+
+
+def run_eflux_conditions(
+    model: cobra.Model,
+    upper_bounds: pd.DataFrame,
+    slack_weight: float = 1000,
+    threads: int = 1,
+    out_path: str | Path | None = None,
+    use_solver_profile: bool = True,
+    remove_loops: bool = False,
+    reuse_solutions: bool = True,
+    report: dict | None = None,
+) -> pd.DataFrame:
+    """Run eflux for many strains/experimental conditions on a pool of threads.
+
+    The relaxed model is built once, and each thread solves its share of the conditions on its own
+    clone of that solver problem, so memory grows by one solver instance per thread instead of one
+    cobra model per worker. Threads only run in parallel for solvers that release the GIL.
+
+    Within a thread, a condition is not solved at all when the previous optimum provably stays optimal:
+    its slack constraint values still fit within the new bounds, and every slack constraint with a
+    nonzero dual value keeps both of its previous bounds, so the same duals still certify optimality.
+
+    inputs:
+        model: cobra model with objective already defined
+        upper_bounds: dataframe of reaction ids (rownames) and upper bounds for each strain/experimental
+                      condition (columns); NaN entries leave that reaction unconstrained in that condition
+                      (its slack constraint is lifted and its slack variable fixed at 0)
+        slack_weight: weight of slack variables relative to model.objective
+        threads: number of threads (and solver clones) used to solve the conditions
+        out_path: optional .npy path; when given, fluxes are written straight into a pre-allocated
+                  memory-mapped matrix there (see utils.create_memmap_matrix) instead of into memory
+        use_solver_profile: solve with the model's saved solver profile, if there is one
+        remove_loops: remove internal loops from each solution with one extra LP (see remove_flux_loops)
+        reuse_solutions: reuse the previous condition's fluxes when they are still optimal
+        report: optional dict that is filled with the total "solve_time" and "loop_removal_time" in
+                seconds, the number of "skipped_solves" and the estimated "time_saved" in seconds
+    outputs:
+        fluxes: dataframe of reaction ids (rownames) and flux values for each condition (columns)
+    """
+    # Check for correct input types
+    if model is None:
+        raise TypeError("model cannot be None")
+    if upper_bounds is None:
+        raise TypeError("upper_bounds cannot be None")
+    if threads < 1:
+        raise ValueError("threads must be at least 1")
+
+    # Build a single relaxed model with an (initially unbounded) slack constraint per bounded reaction
+    relaxed_model = add_slack_variables_to_model(
+        model,
+        dict.fromkeys(upper_bounds.index),
+        slack_weight=slack_weight,
+        use_solver_profile=use_solver_profile,
+    )
+    forward_ids = [r.forward_variable.name for r in relaxed_model.reactions]
+    reverse_ids = [r.reverse_variable.name for r in relaxed_model.reactions]
+    constraint_ids = ["SLACK_BOUND_" + r_id for r_id in upper_bounds.index]
+    bounds = upper_bounds.to_numpy(dtype=float)
+
+    # Split conditions into contiguous chunks, one per thread, each with its own solver clone
+    chunks = [c for c in np.array_split(np.arange(bounds.shape[1]), threads) if len(c) > 0]
+    template = relaxed_model.solver
+    solvers = [template if i == 0 else type(template).clone(template) for i in range(len(chunks))]
+    if remove_loops:
+        # Build the loop removal problem once and clone it for every thread
+        loop_template, internal, forward_lb, reverse_lb = _build_cycle_free_problem(
+            relaxed_model, list(upper_bounds.index)
+        )
+        loop_problems = [
+            loop_template if i == 0 else type(loop_template).clone(loop_template)
+            for i in range(len(chunks))
+        ]
+    else:
+        loop_problems = [None] * len(chunks)
+    rxn_ids = [r.id for r in relaxed_model.reactions]
+    if out_path is None:
+        fluxes = np.empty((len(rxn_ids), bounds.shape[1]))
+    else:
+        fluxes = create_memmap_matrix(out_path, rxn_ids, list(upper_bounds.columns))
+
+    def solve_chunk(solver, loop_problem, columns):
+        timings = {"solve_time": 0.0, "loop_removal_time": 0.0, "solves": 0, "skipped_solves": 0}
+        constraints = [solver.constraints[c_id] for c_id in constraint_ids]
+        slack_vars = [solver.variables["SLACK_" + r_id] for r_id in upper_bounds.index]
+        if loop_problem is not None:
+            loop_forward = [loop_problem.variables[f] for f in forward_ids]
+            loop_reverse = [loop_problem.variables[r] for r in reverse_ids]
+        tolerances = solver.configuration.tolerances
+        feasibility_tol = tolerances.feasibility
+        # Dual values are checked against the optimality tolerance, if the solver has one
+        optimality_tol = getattr(tolerances, "optimality", feasibility_tol)
+        previous = None
+        for j in columns:
+            # Slack constraint bounds for this condition (both sides are lifted for NaN bounds)
+            is_unbounded = np.isnan(bounds[:, j])
+            this_lb = np.where(is_unbounded, -np.inf, 0.0)
+            this_ub = np.where(is_unbounded, np.inf, bounds[:, j])
+
+            # Reuse the previous solution if it is still feasible and its duals still certify optimality
+            if reuse_solutions and previous is not None:
+                prev_lb, prev_ub, prev_values, prev_slacks, prev_duals, prev_fluxes = previous
+                is_feasible = (
+                    np.all(prev_values <= this_ub + feasibility_tol)
+                    and np.all(prev_values >= this_lb - feasibility_tol)
+                    and np.all(prev_slacks[is_unbounded] <= feasibility_tol)
+                )
+                keeps_bounds = np.isclose(
+                    this_lb, prev_lb, rtol=0, atol=feasibility_tol
+                ) & np.isclose(this_ub, prev_ub, rtol=0, atol=feasibility_tol)
+                if is_feasible and np.all((np.abs(prev_duals) <= optimality_tol) | keeps_bounds):
+                    fluxes[:, j] = prev_fluxes
+                    timings["skipped_solves"] += 1
+                    continue
+
+            start = time.perf_counter()
+            for constraint, slack_var, bound in zip(
+                constraints, slack_vars, bounds[:, j], strict=True
+            ):
+                if np.isnan(bound):
+                    # Drop both sides of the slack constraint, as if the reaction had no bound
+                    constraint.lb = None
+                    constraint.ub = None
+                    slack_var.ub = 0
+                else:
+                    constraint.ub = bound
+                    constraint.lb = 0
+                    slack_var.ub = None
+            status = solver.optimize()
+            if status != "optimal":
+                raise cobra.exceptions.OptimizationError(
+                    f"Condition {upper_bounds.columns[j]} could not be solved (status: {status})"
+                )
+            primals = solver.primal_values
+            this_fluxes = np.array([
+                primals[f] - primals[r] for f, r in zip(forward_ids, reverse_ids, strict=True)
+            ])
+            timings["solve_time"] += time.perf_counter() - start
+            timings["solves"] += 1
+
+            if loop_problem is not None:
+                start = time.perf_counter()
+                this_fluxes = _solve_cycle_free(
+                    loop_problem,
+                    loop_forward,
+                    loop_reverse,
+                    internal,
+                    forward_lb,
+                    reverse_lb,
+                    this_fluxes,
+                )
+                timings["loop_removal_time"] += time.perf_counter() - start
+
+            fluxes[:, j] = this_fluxes
+            if reuse_solutions:
+                constraint_values = solver.constraint_values
+                shadow_prices = solver.shadow_prices
+                previous = (
+                    this_lb,
+                    this_ub,
+                    np.array([constraint_values[c_id] for c_id in constraint_ids]),
+                    np.array([primals[v.name] for v in slack_vars]),
+                    np.array([shadow_prices[c_id] for c_id in constraint_ids]),
+                    this_fluxes,
+                )
+
+        return timings
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(solve_chunk, s, p, c)
+            for s, p, c in zip(solvers, loop_problems, chunks, strict=True)
+        ]
+        chunk_timings = [future.result() for future in futures]
+
+    if report is not None:
+        report["solve_time"] = sum(t["solve_time"] for t in chunk_timings)
+        report["loop_removal_time"] = sum(t["loop_removal_time"] for t in chunk_timings)
+        report["skipped_solves"] = sum(t["skipped_solves"] for t in chunk_timings)
+        # Estimate the time saved from the average time of the solves that did run
+        solves = sum(t["solves"] for t in chunk_timings)
+        report["time_saved"] = (
+            report["skipped_solves"]
+            * (report["solve_time"] + report["loop_removal_time"])
+            / max(solves, 1)
+        )
+
+    if out_path is not None:
+        fluxes.flush()
+
+    return pd.DataFrame(fluxes, index=rxn_ids, columns=upper_bounds.columns, copy=False)
+
+
 def run_condition_specific_eflux(
     model: cobra.Model,
     growth_rxn_id: str,
@@ -0,0 +1,135 @@
+"""Autotune the solver and LP parameters used by eflux for a model."""
+
+import itertools
+import time
+
+import cobra
+import numpy as np
+import pandas as pd
+
+from .eflux2 import run_eflux_conditions
+from .utils import apply_solver_profile, get_max_flux_bounds, save_solver_profile
+
+
+def get_solver_profile_candidates(
+    solvers: list[str] | None = None,
+    lp_methods: tuple = ("primal", "dual", "barrier"),
+    presolve: tuple = (False, True),
+    feasibility_tolerances: tuple = (None, 1e-6),
+) -> list[dict]:
+    """List the solver profiles to try, skipping LP methods a solver does not support.
+
+    inputs:
+        solvers: solver names to try (default: every installed solver except exact ones)
+        lp_methods: LP methods to try on solvers that expose one (e.g. cplex, gurobi)
+        presolve: presolve settings to try
+        feasibility_tolerances: feasibility tolerances to try (None keeps the solver default)
+    outputs:
+        candidates: list of solver profiles
+    """
+    if solvers is None:
+        solvers = [s for s in cobra.util.solver.solvers if "exact" not in s]
+
+    candidates = []
+    for solver in solvers:
+        configuration = cobra.util.solver.solvers[solver].Model().configuration
+        # Only try LP methods the solver accepts
+        solver_lp_methods = [None]
+        if hasattr(configuration, "lp_method"):
+            solver_lp_methods = []
+            for lp_method in lp_methods:
+                try:
+                    configuration.lp_method = lp_method
+                except ValueError:
+                    continue
+                solver_lp_methods.append(lp_method)
+
+        for lp_method, this_presolve, tolerance in itertools.product(
+            solver_lp_methods, presolve, feasibility_tolerances
+        ):
+            candidates.append({
+                "solver": solver,
+                "lp_method": lp_method,
+                "presolve": this_presolve,
+                "feasibility_tolerance": tolerance,
+            })
+
+    return candidates
+
+
+def autotune_solver_profile(
+    model: cobra.Model,
+    upper_bounds: pd.DataFrame,
+    rxn_list: list[str],
+    candidates: list[dict] | None = None,
+    atol: float = 1e-6,
+    save: bool = True,
+) -> dict:
+    """Find the fastest solver profile that reproduces eflux and FVA results for a model.
+
+    Each candidate profile is timed on the eflux solves of a short, representative set of conditions
+    (every condition is solved; solution reuse is turned off) plus the FVA from get_max_flux_bounds. Candidates whose fluxes or FVA bounds differ from those of
+    the model's current solver settings are rejected. The winner is saved (see utils.save_solver_profile)
+    so that add_slack_variables_to_model, get_max_flux_bounds and run_eflux_conditions pick it up.
+    inputs:
+        model: cobra model with objective already defined
+        upper_bounds: dataframe of reaction ids (rownames) and upper bounds for a few representative
+                      strain/experimental conditions (columns), as for run_eflux_conditions
+        rxn_list: list of reactions excluded from FVA, as for get_max_flux_bounds
+        candidates: solver profiles to try (default: get_solver_profile_candidates())
+        atol: absolute tolerance when comparing fluxes and FVA bounds to the reference results
+        save: save the fastest profile for later runs
+    outputs:
+        profile: fastest matching solver profile, with "eflux_time" and "fva_time" in seconds
+    """
+    if candidates is None:
+        candidates = get_solver_profile_candidates()
+
+    # Reference results with the model's current solver settings, solving every condition
+    ref_fluxes = run_eflux_conditions(
+        model, upper_bounds, use_solver_profile=False, reuse_solutions=False
+    )
+    ref_bounds = pd.Series(get_max_flux_bounds(model, rxn_list, use_solver_profile=False))
+
+    best_profile = None
+    for candidate in candidates:
+        tuned_model = model.copy()
+        try:
+            apply_solver_profile(tuned_model, candidate)
+            start = time.perf_counter()
+            fluxes = run_eflux_conditions(
+                tuned_model, upper_bounds, use_solver_profile=False, reuse_solutions=False
+            )
+            eflux_time = time.perf_counter() - start
+            start = time.perf_counter()
+            bounds = pd.Series(get_max_flux_bounds(tuned_model, rxn_list, use_solver_profile=False))
+            fva_time = time.perf_counter() - start
+        except (
+            KeyError,
+            ValueError,
+            cobra.exceptions.SolverNotFound,
+            cobra.exceptions.OptimizationError,
+        ):
+            # Skip settings the solver rejects or cannot solve with
+            continue
+
+        # Reject candidates that do not reproduce the reference results
+        if not (
+            np.allclose(fluxes, ref_fluxes, atol=atol)
+            and np.allclose(bounds[ref_bounds.index], ref_bounds, atol=atol)
+        ):
+            continue
+
+        profile = {**candidate, "eflux_time": eflux_time, "fva_time": fva_time}
+        if best_profile is None or eflux_time + fva_time < (
+            best_profile["eflux_time"] + best_profile["fva_time"]
+        ):
+            best_profile = profile
+
+    if best_profile is None:
+        raise ValueError("No solver profile reproduced the reference eflux and FVA results")
+
+    if save:
+        save_solver_profile(model, best_profile)
+
+    return best_profile
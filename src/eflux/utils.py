@@ -1,15 +1,131 @@
 """Utils module for eflux package."""
 
+import hashlib
+import json
+import os
+from pathlib import Path
 from typing import Tuple
 
 import cobra
 import numpy as np
 import pandas as pd
 from cobra import Gene, Reaction
+from cobra.util.solver import linear_reaction_coefficients
+
+
+def get_solver_profile_path(model: cobra.Model) -> Path:
+    """Path of the saved solver profile for a model.
+
+    Profiles live in the directory named by the EFLUX_PROFILE_DIR environment variable
+    (default: ~/.eflux/profiles) and are named after the model id.
+    inputs:
+        model: cobra model with a non-empty id that contains no path separators
+    outputs:
+        path: path of the json solver profile for this model
+    """
+    if not model.id or any(sep in model.id for sep in ("/", "\\", os.sep)):
+        raise ValueError(f"Model id {model.id!r} cannot be used as a solver profile name")
+
+    profile_dir = Path(os.environ.get("EFLUX_PROFILE_DIR", Path.home() / ".eflux" / "profiles"))
+    return profile_dir / f"{model.id}.json"
+
+
+def get_model_fingerprint(model: cobra.Model) -> str:
+    """Hash of the model structure a solver profile is tuned on.
+
+    inputs:
+        model: cobra model
+    outputs:
+        fingerprint: sha256 hex digest of the metabolite ids, reaction ids, bounds and stoichiometry,
+                     and the objective coefficients and direction
+    """
+    structure = {
+        "metabolites": sorted(m.id for m in model.metabolites),
+        "reactions": sorted(
+            [
+                r.id,
+                r.lower_bound,
+                r.upper_bound,
+                sorted((m.id, c) for m, c in r.metabolites.items()),
+            ]
+            for r in model.reactions
+        ),
+        "objective": sorted((r.id, c) for r, c in linear_reaction_coefficients(model).items()),
+        "direction": model.objective.direction,
+    }
+    return hashlib.sha256(json.dumps(structure).encode()).hexdigest()
+
+
+def save_solver_profile(model: cobra.Model, profile: dict) -> Path:
+    """Save a solver profile (e.g. from tuning.autotune_solver_profile) for a model.
+
+    inputs:
+        model: cobra model the profile was tuned on
+        profile: dict with "solver" and optional "presolve", "lp_method" and "feasibility_tolerance" keys
+    outputs:
+        path: path the profile was written to
+    """
+    path = get_solver_profile_path(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {**profile, "fingerprint": get_model_fingerprint(model)},
+            indent=2,
+        )
+    )
+    return path
+
+
+def load_solver_profile(model: cobra.Model) -> dict | None:
+    """Load the saved solver profile for a model.
+
+    inputs:
+        model: cobra model
+    outputs:
+        profile: saved solver profile, or None if the model id cannot name a profile, there is none,
+                 it was tuned on a model with a different fingerprint, or its solver is not installed
+    """
+    try:
+        path = get_solver_profile_path(model)
+    except ValueError:
+        return None
+    if not path.exists():
+        return None
+
+    profile = json.loads(path.read_text())
+    if (
+        profile.get("fingerprint") != get_model_fingerprint(model)
+        or profile.get("solver") not in cobra.util.solver.solvers
+    ):
+        return None
+
+    return profile
+
+
+def apply_solver_profile(model: cobra.Model, profile: dict) -> None:
+    """Set the solver and LP parameters of a model (in place) from a solver profile.
+
+    inputs:
+        model: cobra model
+        profile: dict with "solver" and optional "presolve", "lp_method" and "feasibility_tolerance" keys
+    """
+    model.solver = profile["solver"]
+    configuration = model.solver.configuration
+    if profile.get("presolve") is not None:
+        configuration.presolve = profile["presolve"]
+    if profile.get("lp_method") is not None:
+        configuration.lp_method = profile["lp_method"]
+    if profile.get("feasibility_tolerance") is not None:
+        configuration.tolerances.feasibility = profile["feasibility_tolerance"]
 
 
 def get_max_flux_bounds(
-    model: cobra.Model, rxn_list: list[str], precision: int = 9
+    model: cobra.Model,
+    rxn_list: list[str],
+    precision: int = 9,
+    use_solver_profile: bool = True,
+    fva_rxn_ids: list[str] | None = None,
+    processes: int = 8,
 ) -> Tuple[cobra.Model, pd.DataFrame]:
     """Get flux bounds from FVA to use in surrogate model of reference strain.
 
@@ -18,19 +134,97 @@ def get_max_flux_bounds(
         model: cobra model
         rxn_list: list of reactions of interest, corresponding to reference strain selection criteria
         zero_threshold: magnitude threshold to identify and replace numerically zero flux values
+        use_solver_profile: run FVA with the model's saved solver profile, if there is one
+        fva_rxn_ids: optional reaction ids to run FVA on (default: all model reactions); reactions in
+                     rxn_list are still excluded from it
+        processes: number of processes used to run FVA
     outputs:
         max_flux_bounds: max flux values to be used as a representative bounds of the reference strain.
     """
+    # Use the tuned solver settings on a copy, leaving the input model untouched
+    profile = load_solver_profile(model) if use_solver_profile else None
+    if profile is not None:
+        model = model.copy()
+        apply_solver_profile(model, profile)
+
     # Run FVA to get (reasonably) tight bounds for all other reactions
-    keep_rxn_list = [r.id for r in model.reactions if (r.id not in rxn_list)]
+    if fva_rxn_ids is None:
+        fva_rxn_ids = [r.id for r in model.reactions]
+    keep_rxn_list = [r for r in fva_rxn_ids if (r not in rxn_list)]
     flux_bounds = cobra.flux_analysis.flux_variability_analysis(
-        model=model, reaction_list=keep_rxn_list, fraction_of_optimum=0.85, processes=8
+        model=model, reaction_list=keep_rxn_list, fraction_of_optimum=0.85, processes=processes
     )
     max_flux_bounds = flux_bounds["maximum"].round(decimals=precision).to_dict()
 
     return max_flux_bounds
 
 
+class LazyMaxFluxBounds:
+    """Max flux bounds from FVA, computed only for the reactions that are asked for.
+
+    Drop-in for the output of get_max_flux_bounds in get_condition_specific_upper_bounds: FVA is
+    run only for reactions covered by a condition's scaling factors, and each reaction's bound is
+    memoized so that later conditions only run FVA on the reactions not seen before.
+    """
+
+    def __init__(
+        self,
+        model: cobra.Model,
+        rxn_list: list[str],
+        precision: int = 9,
+        use_solver_profile: bool = True,
+        processes: int = 1,
+    ):
+        """Set up the bound provider.
+
+        inputs:
+            model: cobra model
+            rxn_list: list of reactions excluded from FVA, as for get_max_flux_bounds
+            precision: number of decimals to round bounds to, as for get_max_flux_bounds
+            use_solver_profile: run FVA with the model's saved solver profile, if there is one
+            processes: number of processes used for each FVA run; the default of 1 avoids starting a
+                       process pool for the few reactions a new condition usually adds
+        """
+        # Apply the tuned solver settings once, rather than on every FVA call
+        profile = load_solver_profile(model) if use_solver_profile else None
+        if profile is not None:
+            model = model.copy()
+            apply_solver_profile(model, profile)
+
+        self.model = model
+        self.rxn_list = set(rxn_list)
+        self.precision = precision
+        self.processes = processes
+        self.bounds: dict[str, float] = {}
+
+    def get_bounds(self, rxn_ids) -> dict[str, float]:
+        """Get max flux bounds for some reactions, running FVA only for those not yet computed.
+
+        inputs:
+            rxn_ids: iterable of reaction ids (e.g. the keys of a condition's scaling factors);
+                     ids in rxn_list or not in the model are skipped
+        outputs:
+            max_flux_bounds: dict of reaction ids (keys) and max flux bounds (values)
+        """
+        rxn_ids = [
+            r for r in rxn_ids if (r not in self.rxn_list) and self.model.reactions.has_id(r)
+        ]
+        missing = [r for r in rxn_ids if r not in self.bounds]
+        if missing:
+            self.bounds.update(
+                get_max_flux_bounds(
+                    self.model,
+                    self.rxn_list,
+                    precision=self.precision,
+                    use_solver_profile=False,
+                    fva_rxn_ids=missing,
+                    processes=self.processes,
+                )
+            )
+
+        return {r: self.bounds[r] for r in rxn_ids}
+
+
 def get_gpr_dict(model: cobra.Model) -> dict[Reaction, set[frozenset[Gene]]]:
     """Gene reaction rule (GPR) for each reaction in the model.
 
@@ -129,3 +323,71 @@ def convert_transcriptomics_to_enzyme_activity(
         return pd.DataFrame()
 
     return enzyme_activity_df.set_index("Reaction_ID")
+
+
+def _memmap_sidecar_paths(path: str | Path) -> Tuple[Path, Path]:
+    """Paths of the row and column id files stored next to a memory-mapped matrix."""
+    path = Path(path)
+    return path.with_suffix(".index.txt"), path.with_suffix(".columns.txt")
+
+
+def create_memmap_matrix(
+    path: str | Path, index: list[str], columns: list[str], fill_value: float = np.nan
+) -> np.memmap:
+    """Pre-allocate a memory-mapped float matrix on disk that workers can write columns into.
+
+    inputs:
+        path: path of the .npy file to create
+        index: row ids (e.g. gene or reaction ids), written to a sidecar <name>.index.txt file
+        columns: column ids (e.g. strains/experimental conditions), written to a sidecar <name>.columns.txt file
+        fill_value: initial value of every entry
+    outputs:
+        matrix: writable column-major (Fortran-ordered) memory-mapped array of shape (len(index), len(columns))
+    """
+    index_path, columns_path = _memmap_sidecar_paths(path)
+    index_path.write_text("".join(f"{i}\n" for i in index))
+    columns_path.write_text("".join(f"{c}\n" for c in columns))
+
+    # Store columns contiguously on disk, so writing one condition's column touches few pages
+    matrix = np.lib.format.open_memmap(
+        Path(path),
+        mode="w+",
+        dtype=np.float64,
+        shape=(len(index), len(columns)),
+        fortran_order=True,
+    )
+    matrix[:] = fill_value
+
+    return matrix
+
+
+def save_memmap_matrix(df: pd.DataFrame, path: str | Path) -> None:
+    """Write a dataframe as a memory-mapped .npy file with sidecar row and column id files.
+
+    inputs:
+        df: dataframe of numeric values, e.g. expression (gene rows), enzyme activity or upper bounds (reaction rows)
+        path: path of the .npy file to write
+    """
+    matrix = create_memmap_matrix(path, list(df.index), list(df.columns))
+    matrix[:] = df.to_numpy(dtype=np.float64)
+    matrix.flush()
+
+
+def load_memmap_matrix(path: str | Path, mode: str = "r") -> pd.DataFrame:
+    """Attach to a memory-mapped matrix written by save_memmap_matrix or create_memmap_matrix.
+
+    inputs:
+        path: path of the .npy file
+        mode: numpy memmap mode, "r" for read-only or "r+" to write into the matrix in place
+    outputs:
+        df: dataframe backed by the memory-mapped file (no copy), indexed by the sidecar row and column ids
+    """
+    index_path, columns_path = _memmap_sidecar_paths(path)
+    matrix = np.load(Path(path), mmap_mode=mode)
+
+    return pd.DataFrame(
+        matrix,
+        index=index_path.read_text().splitlines(),
+        columns=columns_path.read_text().splitlines(),
+        copy=False,
+    )
@@ -7,6 +7,14 @@ from cobra.core import Metabolite, Reaction
 from cobra.core.model import Model
 
 
+@pytest.fixture(autouse=True)
+def solver_profile_dir(tmp_path, monkeypatch):
+    """Keep saved solver profiles in a temporary directory during tests."""
+    profile_dir = tmp_path / "profiles"
+    monkeypatch.setenv("EFLUX_PROFILE_DIR", str(profile_dir))
+    return profile_dir
+
+
 @pytest.fixture(
     name="cobra_model",
 )
@@ -115,6 +123,29 @@ def min_uptake_model(model_with_objective):
     return model
 
 
+@pytest.fixture(
+    name="loop_model",
+)
+def loop_model(min_uptake_model):
+    """Fixture to add reversible reaction r5 (m3 <-> m2), forming an internal loop with r3.
+
+    At the optimum r5 runs in reverse, carrying m2 to m3 alongside r3.
+    """
+    model = min_uptake_model.copy()
+    r5 = Reaction("r5", lower_bound=-3, upper_bound=3)
+    r5.add_metabolites({model.metabolites.m3: -1, model.metabolites.m2: 1})
+    model.add_reactions([r5])
+    return model
+
+
+@pytest.fixture(
+    name="loop_fluxes",
+)
+def loop_fluxes():
+    """Fixture for fluxes of loop_model with a flux of 1.0 around the r3/r5 loop."""
+    return {"r1": 4.0, "r2": 4.0, "r3": 5.0, "r4": 4.0, "r5": 1.0}
+
+
 @pytest.fixture(
     name="infeasible_upper_bounds",
 )
@@ -191,3 +222,18 @@ def input_normalized_enzyme_activity():
 def expected_dict_from_get_enzyme_bounds():
     """Fixture for expected bounds from enzyme activity for output comparison."""
     return {"r1": 750.0, "r2": 12.5, "r3": 0.5, "r4": 1100.0}
+
+
+@pytest.fixture(
+    name="condition_upper_bounds",
+)
+def condition_upper_bounds():
+    """Fixture for upper bounds of several conditions of loop_model, with NaN for unbounded reactions."""
+    return pd.DataFrame(
+        {
+            "cond1": [3.0, np.nan, np.nan],
+            "cond2": [10.0, np.nan, np.nan],
+            "cond3": [2.0, 5.0, np.nan],
+        },
+        index=["r3", "r4", "r5"],
+    )
@@ -1,12 +1,17 @@
 """Tests for eflux functions."""
 
+import numpy as np
+import pandas as pd
 import pytest
 from cobra import exceptions
 from eflux.eflux2 import (
     add_slack_variables_to_model,
     get_condition_specific_upper_bounds,
     get_normalized_condition,  # run_condition_specific_eflux,
+    remove_flux_loops,
+    run_eflux_conditions,
 )
+from eflux.utils import LazyMaxFluxBounds, load_memmap_matrix
 
 
 def test_add_slack_variables_to_model(min_uptake_model, infeasible_upper_bounds, expected_fluxes):
@@ -111,6 +116,108 @@ def test_get_condition_specific_upper_bounds(
     assert enzyme_bounds == expected_dict_from_get_enzyme_bounds
 
 
+def test_get_condition_specific_upper_bounds_with_lazy_fva(cobra_model):
+    """Test get_condition_specific_upper_bounds with FVA bounds computed on demand."""
+    provider = LazyMaxFluxBounds(cobra_model, ["r1", "r4"])
+    enzyme_bounds = get_condition_specific_upper_bounds(
+        fva_upper_bounds=provider, scaling_factors={"r2": 0.5}
+    )
+    assert enzyme_bounds == {"r2": 2.5}
+    assert provider.bounds == {"r2": 5}
+
+
+def test_run_eflux_conditions(loop_model, condition_upper_bounds, tmp_path):
+    """Test run_eflux_conditions function."""
+    # Test run_eflux_conditions with None inputs and a bad thread count.
+    with pytest.raises(TypeError):
+        run_eflux_conditions(None, condition_upper_bounds)
+    with pytest.raises(TypeError):
+        run_eflux_conditions(loop_model, None)
+    with pytest.raises(ValueError):
+        run_eflux_conditions(loop_model, condition_upper_bounds, threads=0)
+
+    # Test that each condition matches a relaxed model built for that condition alone.
+    fluxes = run_eflux_conditions(loop_model, condition_upper_bounds)
+    assert fluxes.shape == (5, 3)
+    for cond in condition_upper_bounds.columns:
+        upper_bounds = condition_upper_bounds[cond].dropna().to_dict()
+        relaxed_model = add_slack_variables_to_model(loop_model, upper_bounds)
+        expected = relaxed_model.optimize().fluxes
+        assert np.allclose(fluxes[cond], expected[fluxes.index])
+
+    # Test that a NaN bound leaves reversible reaction r5 free to run in reverse.
+    assert fluxes.loc["r5"].tolist() == pytest.approx([-3.0, -3.0, -3.0])
+
+    # Test that solving on several threads gives the same fluxes.
+    threaded_fluxes = run_eflux_conditions(loop_model, condition_upper_bounds, threads=2)
+    assert np.allclose(threaded_fluxes, fluxes)
+
+    # Test that fluxes can be written straight into a memory-mapped output matrix.
+    out_path = tmp_path / "fluxes.npy"
+    run_eflux_conditions(loop_model, condition_upper_bounds, threads=2, out_path=out_path)
+    assert load_memmap_matrix(out_path).equals(fluxes)
+
+    # Test that an upper bounds dataframe without conditions gives an empty flux dataframe.
+    for remove_loops in (False, True):
+        empty_fluxes = run_eflux_conditions(
+            loop_model, condition_upper_bounds.iloc[:, :0], remove_loops=remove_loops
+        )
+        assert empty_fluxes.shape == (5, 0)
+
+
+def test_run_eflux_conditions_with_solution_reuse(min_uptake_model):
+    """Test that run_eflux_conditions skips solves only when the previous optimum still holds."""
+    upper_bounds = pd.DataFrame(
+        {"cond1": [10.0], "cond2": [8.0], "cond3": [3.0], "cond4": [3.0]}, index=["r3"]
+    )
+    report = {}
+    fluxes = run_eflux_conditions(min_uptake_model, upper_bounds, report=report)
+    expected = run_eflux_conditions(min_uptake_model, upper_bounds, reuse_solutions=False)
+    assert np.allclose(fluxes, expected)
+
+    # cond2 only loosens a non-binding bound and cond4 repeats cond3, cond3 tightens a binding one
+    assert report["skipped_solves"] == 2
+    assert report["time_saved"] > 0
+
+
+def test_run_eflux_conditions_with_solution_reuse_and_nan_bounds(loop_model):
+    """Test that solution reuse accounts for NaN bounds turning finite between conditions."""
+    # r5 runs in reverse while unbounded, so a finite bound (which implies r5 >= 0) must be re-solved
+    upper_bounds = pd.DataFrame(
+        {"cond1": [np.nan, 10.0], "cond2": [3.0, 10.0], "cond3": [np.nan, 10.0]},
+        index=["r5", "r3"],
+    )
+    report = {}
+    fluxes = run_eflux_conditions(loop_model, upper_bounds, report=report)
+    expected = run_eflux_conditions(loop_model, upper_bounds, reuse_solutions=False)
+    assert np.allclose(fluxes, expected)
+    assert fluxes.loc["r5"].tolist() == pytest.approx([-3.0, 0.0, -3.0])
+    assert report["skipped_solves"] == 0
+
+
+def test_remove_flux_loops(loop_model, loop_fluxes):
+    """Test remove_flux_loops function."""
+    loopless_fluxes = remove_flux_loops(loop_model, loop_fluxes)
+    assert loopless_fluxes == pytest.approx({"r1": 4.0, "r2": 4.0, "r3": 4.0, "r4": 4.0, "r5": 0.0})
+
+    # Test that a loopless solution is left unchanged
+    assert remove_flux_loops(loop_model, loopless_fluxes) == pytest.approx(loopless_fluxes)
+
+
+def test_run_eflux_conditions_with_loop_removal(loop_model, condition_upper_bounds):
+    """Test run_eflux_conditions with loop removal."""
+    fluxes = run_eflux_conditions(loop_model, condition_upper_bounds)
+    report = {}
+    loopless_fluxes = run_eflux_conditions(
+        loop_model, condition_upper_bounds, threads=2, remove_loops=True, report=report
+    )
+    for cond in condition_upper_bounds.columns:
+        expected = remove_flux_loops(loop_model, fluxes[cond].to_dict())
+        assert loopless_fluxes[cond].to_dict() == pytest.approx(expected)
+    assert report["solve_time"] > 0
+    assert report["loop_removal_time"] > 0
+
+
 # @pytest.fixture
 # def external_fluxes():
 #     return pd.DataFrame({'rxn1': [1.0], 'rxn2': [2.0]})
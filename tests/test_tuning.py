@@ -0,0 +1,41 @@
+"""Tests for eflux.tuning."""
+
+import pytest
+from eflux.tuning import autotune_solver_profile, get_solver_profile_candidates
+from eflux.utils import load_solver_profile
+
+
+def test_get_solver_profile_candidates():
+    """Test get_solver_profile_candidates function."""
+    candidates = get_solver_profile_candidates(
+        solvers=["glpk"], presolve=(False, True), feasibility_tolerances=(None,)
+    )
+    # GLPK has no LP method setting, so only presolve varies
+    assert candidates == [
+        {"solver": "glpk", "lp_method": None, "presolve": False, "feasibility_tolerance": None},
+        {"solver": "glpk", "lp_method": None, "presolve": True, "feasibility_tolerance": None},
+    ]
+
+
+def test_autotune_solver_profile(loop_model, condition_upper_bounds):
+    """Test autotune_solver_profile function."""
+    candidates = get_solver_profile_candidates(solvers=["glpk"])
+    profile = autotune_solver_profile(
+        loop_model, condition_upper_bounds, ["r1"], candidates=candidates
+    )
+    assert {k: profile[k] for k in candidates[0]} in candidates
+    assert profile["eflux_time"] > 0
+    assert profile["fva_time"] > 0
+
+    # Test that the profile was saved for later runs
+    assert load_solver_profile(loop_model)["solver"] == profile["solver"]
+
+    # Test that no profile is chosen when no candidate can be applied
+    with pytest.raises(ValueError):
+        autotune_solver_profile(
+            loop_model,
+            condition_upper_bounds,
+            ["r1"],
+            candidates=[{"solver": "not_a_solver"}, {"solver": "glpk", "presolve": "bad_value"}],
+            save=False,
+        )
@@ -2,12 +2,22 @@
 
 import numpy as np
 import pandas as pd
+import pytest
+from cobra.core import Metabolite
 from cobra.core.model import Model
 from eflux.utils import (
+    LazyMaxFluxBounds,
+    apply_solver_profile,
     convert_transcriptomics_to_enzyme_activity,
+    create_memmap_matrix,
     gene_expression_to_enzyme_activity,
     get_gpr_dict,
     get_max_flux_bounds,
+    get_solver_profile_path,
+    load_memmap_matrix,
+    load_solver_profile,
+    save_memmap_matrix,
+    save_solver_profile,
 )
 
 
@@ -31,6 +41,68 @@ def test_get_max_flux_bounds_with_zero_threshold(cobra_model):
     # Check that flux bounds are set correctly when zero_threshold is set to 0
 
 
+def test_get_max_flux_bounds_for_reaction_subset(cobra_model):
+    """Test flux bounds when FVA is restricted to a subset of reactions."""
+    flux_bounds = get_max_flux_bounds(cobra_model, ["r1", "r4"], fva_rxn_ids=["r1", "r2"])
+    assert flux_bounds == {"r2": 5}
+
+
+def test_lazy_max_flux_bounds(cobra_model):
+    """Test LazyMaxFluxBounds computes and memoizes only the requested bounds."""
+    provider = LazyMaxFluxBounds(cobra_model, ["r1", "r4"])
+    assert provider.get_bounds(["r2", "not_a_reaction"]) == {"r2": 5}
+    assert provider.bounds == {"r2": 5}
+
+    # Test that reactions in rxn_list are skipped and only new reactions are added
+    assert provider.get_bounds(["r1", "r2", "r3"]) == {"r2": 5, "r3": 5}
+    assert provider.bounds == {"r2": 5, "r3": 5}
+
+    # Test that FVA can also run on several processes
+    provider = LazyMaxFluxBounds(cobra_model, ["r1", "r4"], processes=2)
+    assert provider.get_bounds(["r2", "r3"]) == {"r2": 5, "r3": 5}
+
+
+def test_solver_profile(cobra_model, solver_profile_dir):
+    """Test saving, loading and applying a solver profile."""
+    # Test that a model without a saved profile has none
+    assert get_solver_profile_path(cobra_model) == solver_profile_dir / "test_model.json"
+    assert load_solver_profile(cobra_model) is None
+
+    # Test that a saved profile is loaded and applied
+    profile = {"solver": "glpk", "presolve": True, "lp_method": None, "feasibility_tolerance": 1e-6}
+    save_solver_profile(cobra_model, profile)
+    loaded_profile = load_solver_profile(cobra_model)
+    assert {k: loaded_profile[k] for k in profile} == profile
+    apply_solver_profile(cobra_model, loaded_profile)
+    assert cobra_model.solver.configuration.presolve is True
+    assert cobra_model.solver.configuration.tolerances.feasibility == 1e-6
+
+    # Test that the profile is ignored once the model changes size
+    cobra_model.add_metabolites([Metabolite("m4")])
+    assert load_solver_profile(cobra_model) is None
+
+    # Test that the profile is ignored for a same-sized model with a changed bound
+    save_solver_profile(cobra_model, profile)
+    edited_model = cobra_model.copy()
+    edited_model.reactions.r3.upper_bound = 4
+    assert load_solver_profile(edited_model) is None
+
+    # Test that get_max_flux_bounds gives the same bounds with a saved profile
+    save_solver_profile(cobra_model, profile)
+    flux_bounds = get_max_flux_bounds(cobra_model, ["r1", "r4"])
+    assert flux_bounds["r2"] == 5
+
+
+def test_solver_profile_with_invalid_model_id():
+    """Test that anonymous models and ids with path separators have no solver profile."""
+    profile = {"solver": "glpk"}
+    for model_id in (None, "", "a/b"):
+        model = Model(model_id)
+        with pytest.raises(ValueError):
+            save_solver_profile(model, profile)
+        assert load_solver_profile(model) is None
+
+
 def test_gpr_dict_for_empty_model():
     """Test get_gpr_dict for an empty model."""
     model = Model("test_model")
@@ -131,3 +203,32 @@ def test_convert_transcriptomics_to_enzyme_activity(
     result = convert_transcriptomics_to_enzyme_activity(input_transcriptomics, cobra_model_2)
     assert result.shape == (4, 2)
     assert result.equals(expected_enzyme_activity)
+
+
+def test_memmap_matrix_round_trip(input_transcriptomics, tmp_path):
+    """Test save_memmap_matrix and load_memmap_matrix functions in utils.py."""
+    path = tmp_path / "expression.npy"
+    save_memmap_matrix(input_transcriptomics, path)
+    assert (tmp_path / "expression.index.txt").exists()
+    assert (tmp_path / "expression.columns.txt").exists()
+
+    # Test that the loaded matrix matches the input and is backed read-only by the file
+    result = load_memmap_matrix(path)
+    assert result.equals(input_transcriptomics.astype(float))
+    assert not result.to_numpy().flags.writeable
+
+
+def test_create_memmap_matrix(tmp_path):
+    """Test create_memmap_matrix function in utils.py."""
+    path = tmp_path / "fluxes.npy"
+    matrix = create_memmap_matrix(path, ["r1", "r2"], ["strain1", "strain2", "strain3"])
+    assert matrix.shape == (2, 3)
+    assert matrix.flags.f_contiguous
+    assert np.isnan(matrix).all()
+
+    # Test that columns written by one handle are seen by another attached to the same file
+    matrix[:, 1] = [1.0, 2.0]
+    matrix.flush()
+    result = load_memmap_matrix(path)
+    assert result["strain2"].to_dict() == {"r1": 1.0, "r2": 2.0}
+    assert result["strain1"].isna().all()